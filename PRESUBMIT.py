@@ -112,6 +112,8 @@ LEGACY_API_DIRS = (
 # NOTE: The set of directories in API_DIRS should be the same as those
 # listed in the table in native-api.md.
 API_DIRS = NATIVE_API_DIRS[:] + LEGACY_API_DIRS[:]
+# For membership tests against the directory of each affected file.
+API_DIRS_SET = frozenset(API_DIRS)
 
 # TARGET_RE matches a GN target, and extracts the target name and the contents.
 TARGET_RE = re.compile(
@@ -130,6 +132,9 @@ DEPS_RE = re.compile(r'\bdeps \+?= \[(?P<deps>.*?)\]',
 # FILE_PATH_RE matches a file path.
 FILE_PATH_RE = re.compile(r'"(?P<file_path>(\w|\/)+)(?P<extension>\.\w+)"')
 
+# BLINK_PATH_RE matches files in the third_party WebKit/blink directories.
+BLINK_PATH_RE = re.compile(r'^third_party[\\\/](WebKit|blink)[\\\/]')
+
 
 def FindSrcDirPath(starting_dir):
     """Returns the abs path to the src/ dir of the project."""
@@ -196,35 +201,39 @@ def CheckNativeApiHeaderChanges(input_api, output_api):
     source_file_filter = lambda x: input_api.FilterSourceFile(
         x, files_to_check=[r'.+\.(gn|gni|h)$'])
     for f in input_api.AffectedSourceFiles(source_file_filter):
-        for path in API_DIRS:
-            dn = os.path.dirname(f.LocalPath())
-            if path == 'api':
-                # Special case: Subdirectories included.
-                if dn == 'api' or dn.startswith('api/'):
-                    files.append(f.LocalPath())
-            else:
-                # Normal case: Subdirectories not included.
-                if dn == path:
-                    files.append(f.LocalPath())
+        dn = os.path.dirname(f.LocalPath())
+        # Subdirectories are only included for api/.
+        if dn in API_DIRS_SET or dn.startswith('api/'):
+            files.append(f.LocalPath())
 
     if files:
         return [output_api.PresubmitNotifyResult(API_CHANGE_MSG, files)]
     return []
 
 
-def CheckNoIOStreamInHeaders(input_api, output_api, source_file_filter):
-    """Checks to make sure no .h files include <iostream>."""
-    files = []
-    pattern = input_api.re.compile(r'^#include\s*<iostream>',
-                                   input_api.re.MULTILINE)
+def _ReadAffectedHeaders(input_api, source_file_filter):
+    """Returns a list of (affected file, contents) for the affected .h files."""
     file_filter = lambda x: (input_api.FilterSourceFile(x) and
                              source_file_filter(x))
-    for f in input_api.AffectedSourceFiles(file_filter):
-        if not f.LocalPath().endswith('.h'):
-            continue
-        contents = input_api.ReadFile(f)
-        if pattern.search(contents):
-            files.append(f)
+    return [(f, input_api.ReadFile(f))
+            for f in input_api.AffectedSourceFiles(file_filter)
+            if f.LocalPath().endswith('.h')]
+
+
+def CheckNoIOStreamInHeaders(input_api,
+                             output_api,
+                             source_file_filter,
+                             affected_headers=None):
+    """Checks to make sure no .h files include <iostream>.
+
+  affected_headers may be passed to share the result of _ReadAffectedHeaders
+  with other header checks, so that each header is only read once.
+  """
+    pattern = input_api.re.compile(r'^#include\s*<iostream>',
+                                   input_api.re.MULTILINE)
+    if affected_headers is None:
+        affected_headers = _ReadAffectedHeaders(input_api, source_file_filter)
+    files = [f for f, contents in affected_headers if pattern.search(contents)]
 
     if len(files) > 0:
         return [
@@ -237,18 +246,19 @@ def CheckNoIOStreamInHeaders(input_api, output_api, source_file_filter):
     return []
 
 
-def CheckNoPragmaOnce(input_api, output_api, source_file_filter):
-    """Make sure that banned functions are not used."""
-    files = []
+def CheckNoPragmaOnce(input_api,
+                      output_api,
+                      source_file_filter,
+                      affected_headers=None):
+    """Make sure that banned functions are not used.
+
+  affected_headers is shared with other header checks, see
+  CheckNoIOStreamInHeaders.
+  """
     pattern = input_api.re.compile(r'^#pragma\s+once', input_api.re.MULTILINE)
-    file_filter = lambda x: (input_api.FilterSourceFile(x) and
-                             source_file_filter(x))
-    for f in input_api.AffectedSourceFiles(file_filter):
-        if not f.LocalPath().endswith('.h'):
-            continue
-        contents = input_api.ReadFile(f)
-        if pattern.search(contents):
-            files.append(f)
+    if affected_headers is None:
+        affected_headers = _ReadAffectedHeaders(input_api, source_file_filter)
+    files = [f for f, contents in affected_headers if pattern.search(contents)]
 
     if files:
         return [
@@ -1037,14 +1047,18 @@ def CommonChecks(input_api, output_api):
     results.extend(
         input_api.canned_checks.CheckPatchFormatted(input_api, output_api))
     results.extend(CheckNativeApiHeaderChanges(input_api, output_api))
+    # Read the affected headers once for all the checks on their contents.
+    affected_headers = _ReadAffectedHeaders(input_api, non_third_party_sources)
     results.extend(
         CheckNoIOStreamInHeaders(input_api,
                                  output_api,
-                                 source_file_filter=non_third_party_sources))
+                                 source_file_filter=non_third_party_sources,
+                                 affected_headers=affected_headers))
     results.extend(
         CheckNoPragmaOnce(input_api,
                           output_api,
-                          source_file_filter=non_third_party_sources))
+                          source_file_filter=non_third_party_sources,
+                          affected_headers=affected_headers))
     results.extend(
         CheckNoFRIEND_TEST(input_api,
                            output_api,
@@ -1102,28 +1116,28 @@ def CheckApiDepsFileIsUpToDate(input_api, output_api):
   added to 'specific_include_rules'.
   """
     results = []
-    api_deps = os.path.join(input_api.PresubmitLocalPath(), 'api', 'DEPS')
-    with open(api_deps) as f:
-        deps_content = _ParseDeps(f.read())
-
-    include_rules = deps_content.get('include_rules', [])
     dirs_to_skip = set(['api', 'docs'])
 
-    # Only check top level directories affected by the current CL.
-    dirs_to_check = set()
+    # Only check top level directories affected by the current CL. Collect
+    # them first so the checks below run once per directory.
+    affected_dirs = set()
     for f in input_api.AffectedFiles():
         path_tokens = [t for t in f.LocalPath().split(os.sep) if t]
         if len(path_tokens) > 1:
-            if (path_tokens[0] not in dirs_to_skip and os.path.isdir(
-                    os.path.join(input_api.PresubmitLocalPath(),
-                                 path_tokens[0]))):
-                dirs_to_check.add(path_tokens[0])
+            affected_dirs.add(path_tokens[0])
+    dirs_to_check = set(
+        d for d in affected_dirs - dirs_to_skip if os.path.isdir(
+            os.path.join(input_api.PresubmitLocalPath(), d)))
+    if not dirs_to_check:
+        return results
+
+    api_deps = os.path.join(input_api.PresubmitLocalPath(), 'api', 'DEPS')
+    with open(api_deps) as f:
+        deps_content = _ParseDeps(f.read())
 
-    missing_include_rules = set()
-    for p in dirs_to_check:
-        rule = '-%s' % p
-        if rule not in include_rules:
-            missing_include_rules.add(rule)
+    include_rules = set(deps_content.get('include_rules', []))
+    missing_include_rules = set('-%s' % p
+                                for p in dirs_to_check) - include_rules
 
     if missing_include_rules:
         error_msg = [
@@ -1396,7 +1410,7 @@ def _CalculateAddedDeps(os_path, old_contents, new_contents):
     old_deps = _ExtractAddRulesFromParsedDeps(_ParseDeps(old_contents))
     new_deps = _ExtractAddRulesFromParsedDeps(_ParseDeps(new_contents))
 
-    added_deps = new_deps.difference(old_deps)
+    added_deps = new_deps - old_deps
 
     results = set()
     for added_dep in added_deps:
@@ -1418,8 +1432,7 @@ def CheckAddedDepsHaveTargetApprovals(input_api, output_api):
     """
     virtual_depended_on_files = set()
 
-    file_filter = lambda f: not input_api.re.match(
-        r"^third_party[\\\/](WebKit|blink)[\\\/].*", f.LocalPath())
+    file_filter = lambda f: not BLINK_PATH_RE.match(f.LocalPath())
     for f in input_api.AffectedFiles(include_deletes=False,
                                      file_filter=file_filter):
         filename = input_api.os_path.basename(f.LocalPath())
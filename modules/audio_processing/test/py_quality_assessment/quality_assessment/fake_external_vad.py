@@ -18,7 +18,8 @@ def main():
     args = parser.parse_args()
 
     array = np.arange(100, dtype=np.float32)
-    array.tofile(open(args.o, 'w'))
+    with open(args.o, 'wb') as f:
+        array.tofile(f)
 
 
 if __name__ == '__main__':
@@ -14,6 +14,7 @@ import shutil
 import tempfile
 import textwrap
 import unittest
+from unittest import mock
 
 import PRESUBMIT
 # pylint: disable=line-too-long
@@ -271,6 +272,125 @@ class CheckNoMixingSourcesTest(unittest.TestCase):
       f.write(content)
 
 
+class CheckNativeApiHeaderChangesTest(unittest.TestCase):
+  def testNotifiesAboutApiHeaderChanges(self):
+    input_api = MockInputApi()
+    input_api.files = [
+        MockFile('api/foo.h'),
+        MockFile('api/units/time_delta.h'),
+        MockFile('media/base/codec.h'),
+        MockFile('media/base/test/fake.h'),
+        MockFile('rtc_base/strings/string_builder.h'),
+    ]
+    results = PRESUBMIT.CheckNativeApiHeaderChanges(input_api, MockOutputApi())
+    self.assertEqual(1, len(results))
+    self.assertEqual(
+        ['api/foo.h', 'api/units/time_delta.h', 'media/base/codec.h'],
+        results[0].items)
+
+  def testNoNotificationForOtherFiles(self):
+    input_api = MockInputApi()
+    input_api.files = [MockFile('apiary/foo.h'), MockFile('pc/test/foo.h')]
+    results = PRESUBMIT.CheckNativeApiHeaderChanges(input_api, MockOutputApi())
+    self.assertEqual(0, len(results))
+
+
+class CheckHeaderContentsTest(unittest.TestCase):
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.header_path = os.path.join(self.tmp_dir, 'foo.h')
+    with open(self.header_path, 'w') as f:
+      f.write('#pragma once\n#include <iostream>\n')
+    self.input_api = MockInputApi()
+    self.input_api.files = [
+        MockFile(self.header_path),
+        MockFile(os.path.join(self.tmp_dir, 'foo.cc')),
+    ]
+    self.output_api = MockOutputApi()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+  def testChecksShareReadHeaders(self):
+    # pylint: disable=protected-access
+    affected_headers = PRESUBMIT._ReadAffectedHeaders(self.input_api,
+                                                      lambda x: True)
+    self.assertEqual([self.header_path],
+                     [f.LocalPath() for f, _ in affected_headers])
+    iostream_errors = PRESUBMIT.CheckNoIOStreamInHeaders(
+        self.input_api, self.output_api, lambda x: True, affected_headers)
+    pragma_errors = PRESUBMIT.CheckNoPragmaOnce(self.input_api,
+                                                self.output_api,
+                                                lambda x: True,
+                                                affected_headers)
+    self.assertEqual(1, len(iostream_errors))
+    self.assertEqual(1, len(pragma_errors))
+
+  def testChecksReadHeadersThemselves(self):
+    errors = PRESUBMIT.CheckNoPragmaOnce(self.input_api, self.output_api,
+                                         lambda x: True)
+    self.assertEqual(1, len(errors))
+
+
+class CheckApiDepsFileIsUpToDateTest(unittest.TestCase):
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    for directory in ('api', 'audio', 'video'):
+      os.mkdir(os.path.join(self.tmp_dir, directory))
+    with open(os.path.join(self.tmp_dir, 'api', 'DEPS'), 'w') as f:
+      f.write('include_rules = [\n  "-audio",\n]\n')
+    self.input_api = MockInputApi()
+    self.input_api.presubmit_local_path = self.tmp_dir
+    self.output_api = MockOutputApi()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+  def testNoErrorIfDirectoryHasIncludeRule(self):
+    self.input_api.files = [
+        MockFile(os.path.join('audio', 'foo.cc')),
+        MockFile(os.path.join('api', 'foo.h')),
+        MockFile('README.md'),
+    ]
+    errors = PRESUBMIT.CheckApiDepsFileIsUpToDate(self.input_api,
+                                                  self.output_api)
+    self.assertEqual(0, len(errors))
+
+  def testErrorIfDirectoryIsMissingIncludeRule(self):
+    self.input_api.files = [
+        MockFile(os.path.join('video', 'foo.cc')),
+        MockFile(os.path.join('video', 'bar', 'baz.cc')),
+    ]
+    errors = PRESUBMIT.CheckApiDepsFileIsUpToDate(self.input_api,
+                                                  self.output_api)
+    self.assertEqual(1, len(errors))
+    self.assertIn('"-video"', str(errors[0]))
+
+  def testChecksEachDirectoryOnce(self):
+    self.input_api.files = [
+        MockFile(os.path.join('video', 'foo.cc')),
+        MockFile(os.path.join('video', 'bar.cc')),
+        MockFile(os.path.join('gone', 'foo.cc')),
+        MockFile(os.path.join('gone', 'bar.cc')),
+    ]
+    with mock.patch('os.path.isdir', wraps=os.path.isdir) as isdir_mock:
+      errors = PRESUBMIT.CheckApiDepsFileIsUpToDate(self.input_api,
+                                                    self.output_api)
+    self.assertEqual(2, isdir_mock.call_count)
+    self.assertEqual(1, len(errors))
+
+  def testApiDepsIsNotParsedWithoutTopLevelDirectories(self):
+    self.input_api.files = [
+        MockFile('BUILD.gn'),
+        MockFile(os.path.join('api', 'foo.h')),
+    ]
+    with mock.patch.object(PRESUBMIT, '_ParseDeps') as parse_mock:
+      errors = PRESUBMIT.CheckApiDepsFileIsUpToDate(self.input_api,
+                                                    self.output_api)
+    self.assertEqual([], errors)
+    parse_mock.assert_not_called()
+
+
 class CheckAssertUsageTest(unittest.TestCase):
   def setUp(self):
     self.input_api = MockInputApi()
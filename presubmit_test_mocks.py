@@ -79,6 +79,11 @@ class MockOutputApi:
       MockOutputApi.PresubmitResult.__init__(self, message, items, long_text)
       self.type = 'error'
 
+  class PresubmitNotifyResult(PresubmitResult):
+    def __init__(self, message, items=None, long_text=''):
+      MockOutputApi.PresubmitResult.__init__(self, message, items, long_text)
+      self.type = 'notify'
+
 
 class MockChange:
   """Mock class for Change class.
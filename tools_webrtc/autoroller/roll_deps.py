@@ -13,12 +13,16 @@
 import argparse
 import base64
 import collections
+import concurrent.futures
 import logging
 import os
 import re
 import subprocess
 import sys
-import urllib.request
+import threading
+
+import requests
+from requests import adapters
 
 
 def FindSrcDirPath():
@@ -61,9 +65,13 @@ CHROMIUM_COMMIT_TEMPLATE = CHROMIUM_SRC_URL + '/+/%s'
 CHROMIUM_LOG_TEMPLATE = CHROMIUM_SRC_URL + '/+log/%s'
 CHROMIUM_FILE_TEMPLATE = CHROMIUM_SRC_URL + '/+/%s/%s'
 
-COMMIT_POSITION_RE = re.compile('^Cr-Commit-Position: .*#([0-9]+).*$')
+COMMIT_POSITION_FOOTER = 'Cr-Commit-Position:'
+# Matched from the start of a line; leading blanks are allowed.
+COMMIT_POSITION_RE = re.compile(r'[^\S\n]*Cr-Commit-Position: .*#([0-9]+)')
 CLANG_REVISION_RE = re.compile(r'^CLANG_REVISION = \'([-0-9a-z]+)\'$')
 ROLL_BRANCH_NAME = 'roll_chromium_revision'
+# Upper bound on concurrent `git ls-remote` calls for WebRTC-only deps.
+LS_REMOTE_MAX_WORKERS = 8
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CHECKOUT_SRC_DIR = FindSrcDirPath()
@@ -77,6 +85,12 @@ ANDROID_DEPS_PATH = 'src/third_party/android_deps/'
 
 NOTIFY_EMAIL = 'webrtc-trooper@grotations.appspotmail.com'
 
+# All remote reads go to the same gitiles host, so share one keep-alive
+# connection pool instead of paying a TLS handshake per request.
+_SESSION = requests.Session()
+_SESSION.mount('https://',
+               adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
 sys.path.append(os.path.join(CHECKOUT_SRC_DIR, 'build'))
 import find_depot_tools
 
@@ -105,6 +119,42 @@ class RollError(Exception):
     pass
 
 
+class _SizeBoundedLruCache:
+    """A thread-safe LRU cache bounded by the total length of its values."""
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def Get(self, key):
+        """Returns the cached value for key, or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def Put(self, key, value):
+        if len(value) > self._max_size:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self._max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+# Gitiles URLs of a given revision are immutable, so their content can be
+# reused for the lifetime of the process, up to this many characters.
+_GITILES_CACHE = _SizeBoundedLruCache(8 * 1024 * 1024)
+
+
 def StrExpansion():
     return lambda str_value: str_value
 
@@ -131,10 +181,16 @@ def ParseLocalDepsFile(filename):
 
 
 def ParseCommitPosition(commit_message):
-    for line in reversed(commit_message.splitlines()):
-        m = COMMIT_POSITION_RE.match(line.strip())
+    # The footer is normally at the end of the message, so look for it from
+    # the tail instead of splitting and matching every line.
+    footer_pos = commit_message.rfind(COMMIT_POSITION_FOOTER)
+    while footer_pos != -1:
+        line_start = commit_message.rfind('\n', 0, footer_pos) + 1
+        m = COMMIT_POSITION_RE.match(commit_message, line_start)
         if m:
             return int(m.group(1))
+        footer_pos = commit_message.rfind(COMMIT_POSITION_FOOTER, 0,
+                                          footer_pos)
     logging.error('Failed to parse commit position id from:\n%s\n',
                   commit_message)
     sys.exit(-1)
@@ -144,13 +200,18 @@ def _RunCommand(command,
                 working_dir=None,
                 ignore_exit_code=False,
                 extra_env=None,
-                input_data=None):
+                input_data=None,
+                text=True):
     """Runs a command and returns the output from that command.
 
     If the command fails (exit code != 0), the function will exit the process.
 
+    Args:
+      text: Whether to decode the outputs. Pass False for callers that only
+        pick a few bytes out of the raw output.
     Returns:
-      A tuple containing the stdout and stderr outputs as strings.
+      A tuple containing the stdout and stderr outputs as strings, or as
+      bytes if text is False.
     """
     working_dir = working_dir or CHECKOUT_SRC_DIR
     logging.debug('CMD: %s CWD: %s', ' '.join(command), working_dir)
@@ -165,7 +226,7 @@ def _RunCommand(command,
                          stderr=subprocess.PIPE,
                          env=env,
                          cwd=working_dir,
-                         universal_newlines=True)
+                         universal_newlines=text)
     std_output, err_output = p.communicate(input_data)
     p.stdout.close()
     p.stderr.close()
@@ -178,32 +239,48 @@ def _RunCommand(command,
     return std_output, err_output
 
 
-def _GetBranches():
-    """Returns a tuple of active,branches.
+def _RunCommandNoCapture(command, working_dir=None):
+    """Runs a command whose output isn't needed, without piping it.
 
-    The 'active' is the name of the currently active branch and 'branches' is a
-    list of all branches.
+    The output goes straight to the parent's stdout/stderr. If the command
+    fails (exit code != 0), the function will exit the process.
     """
-    lines = _RunCommand(['git', 'branch'])[0].split('\n')
-    branches = []
-    active = ''
-    for line in lines:
-        if '*' in line:
-            # The assumption is that the first char will always be the '*'.
-            active = line[1:].strip()
-            branches.append(active)
-        else:
-            branch = line.strip()
-            if branch:
-                branches.append(branch)
-    return active, branches
+    working_dir = working_dir or CHECKOUT_SRC_DIR
+    logging.debug('CMD: %s CWD: %s', ' '.join(command), working_dir)
+    returncode = subprocess.call(command,
+                                 stdin=subprocess.DEVNULL,
+                                 cwd=working_dir)
+    if returncode != 0:
+        logging.error('Command failed: %s', ' '.join(command))
+        sys.exit(returncode)
+
+
+def _GetActiveBranch():
+    """Returns the name of the checked out branch, or '' if HEAD is detached."""
+    stdout, _ = _RunCommand(
+        ['git', 'symbolic-ref', '--quiet', '--short', 'HEAD'],
+        ignore_exit_code=True)
+    return stdout.strip()
+
+
+def _BranchExists(branch_name):
+    logging.debug('Checking whether branch %s exists', branch_name)
+    command = [
+        'git', 'rev-parse', '--verify', '--quiet', 'refs/heads/' + branch_name
+    ]
+    return subprocess.call(
+        command, stdout=subprocess.DEVNULL, cwd=CHECKOUT_SRC_DIR) == 0
 
 
 def _ReadGitilesContent(url):
-    # Download and decode BASE64 content until
-    # https://code.google.com/p/gitiles/issues/detail?id=7 is fixed.
-    base64_content = ReadUrlContent(url + '?format=TEXT')
-    return base64.b64decode(base64_content[0]).decode('utf-8')
+    content = _GITILES_CACHE.Get(url)
+    if content is None:
+        # Download and decode BASE64 content until
+        # https://code.google.com/p/gitiles/issues/detail?id=7 is fixed.
+        base64_content = _ReadUrlBytes(url + '?format=TEXT')
+        content = base64.b64decode(base64_content).decode('utf-8')
+        _GITILES_CACHE.Put(url, content)
+    return content
 
 
 def ReadRemoteCrFile(path_below_src, revision):
@@ -232,14 +309,18 @@ def ReadUrlContent(url):
     Returns:
       A list of lines.
     """
-    conn = urllib.request.urlopen(url)
+    return _ReadUrlBytes(url).splitlines(keepends=True)
+
+
+def _ReadUrlBytes(url):
+    """Connect to a remote host and read the whole response body as bytes."""
     try:
-        return conn.readlines()
-    except IOError as e:
+        response = _SESSION.get(url)
+        response.raise_for_status()
+        return response.content
+    except requests.RequestException as e:
         logging.exception('Error connecting to %s. Error: %s', url, e)
         raise
-    finally:
-        conn.close()
 
 
 def GetMatchingDepsEntries(depsentry_dict, dir_path):
@@ -276,14 +357,16 @@ def BuildDepsentryDict(deps_dict):
             if path in result:
                 continue
             if not isinstance(dep, dict):
-                dep = {'url': dep}
-            if dep.get('dep_type') == 'cipd':
+                url = dep
+            elif dep.get('dep_type') == 'cipd':
                 result[path] = CipdDepsEntry(path, dep['packages'])
+                continue
+            else:
+                url = dep['url']
+            if '@' not in url:
+                result[path] = DepsEntry(path, url, 'HEAD')
             else:
-                if '@' not in dep['url']:
-                    url, revision = dep['url'], 'HEAD'
-                else:
-                    url, revision = dep['url'].split('@')
+                url, revision = url.split('@')
                 result[path] = DepsEntry(path, url, revision)
 
     def AddVersionEntry(vars_subdict):
@@ -315,15 +398,14 @@ def _FindChangedCipdPackages(path, old_pkgs, new_pkgs):
                         'remove \"%s\"' %
                         (old_pkgs, new_pkgs, added_pkgs, removed_pkgs))
 
+    new_versions = {p['package']: p['version'] for p in new_pkgs}
     for old_pkg in old_pkgs:
-        for new_pkg in new_pkgs:
-            old_version = old_pkg['version']
-            new_version = new_pkg['version']
-            if (old_pkg['package'] == new_pkg['package']
-                    and old_version != new_version):
-                logging.debug('Roll dependency %s to %s', path, new_version)
-                yield ChangedCipdPackage(path, old_pkg['package'], old_version,
-                                         new_version)
+        old_version = old_pkg['version']
+        new_version = new_versions[old_pkg['package']]
+        if old_version != new_version:
+            logging.debug('Roll dependency %s to %s', path, new_version)
+            yield ChangedCipdPackage(path, old_pkg['package'], old_version,
+                                     new_version)
 
 
 def _FindChangedVars(name, old_version, new_version):
@@ -332,6 +414,20 @@ def _FindChangedVars(name, old_version, new_version):
         yield ChangedVersionEntry(name, old_version, new_version)
 
 
+def _GetRemoteHeadRevision(url):
+    stdout, _ = _RunCommand(['git', 'ls-remote', url, 'HEAD'], text=False)
+    return stdout.strip().split(b'\t')[0].decode('utf-8')
+
+
+def _FindChangedDep(webrtc_deps_entry, new_rev):
+    # Check if an update is necessary.
+    if webrtc_deps_entry.revision != new_rev:
+        logging.debug('Roll dependency %s to %s', webrtc_deps_entry.path,
+                      new_rev)
+        yield ChangedDep(webrtc_deps_entry.path, webrtc_deps_entry.url,
+                         webrtc_deps_entry.revision, new_rev)
+
+
 def _FindNewDeps(old, new):
     """ Gather dependencies only in `new` and return corresponding paths. """
     old_entries = set(BuildDepsentryDict(old))
@@ -426,6 +522,8 @@ def CalculateChangedDeps(webrtc_deps, new_cr_deps):
       A list of ChangedDep objects representing the changed deps.
     """
     result = []
+    # WebRTC-only deps that have to be rolled to the HEAD of their repo.
+    pending_head_entries = []
     webrtc_entries = BuildDepsentryDict(webrtc_deps)
     new_cr_entries = BuildDepsentryDict(new_cr_deps)
     for path, webrtc_deps_entry in webrtc_entries.items():
@@ -448,31 +546,39 @@ def CalculateChangedDeps(webrtc_deps, new_cr_deps):
                 continue
 
             # Use the revision from Chromium's DEPS file.
-            new_rev = cr_deps_entry.revision
             assert webrtc_deps_entry.url == cr_deps_entry.url, (
                 'WebRTC DEPS entry %s has a different URL %s than Chromium %s.'
                 % (path, webrtc_deps_entry.url, cr_deps_entry.url))
-        else:
-            if isinstance(webrtc_deps_entry, DepsEntry):
-                # Use the HEAD of the deps repo.
-                stdout, _ = _RunCommand(
-                    ['git', 'ls-remote', webrtc_deps_entry.url, 'HEAD'])
-                new_rev = stdout.strip().split('\t')[0]
-            else:
-                # The dependency has been removed from chromium.
-                # This is handled by FindRemovedDeps.
-                continue
-
-        # Check if an update is necessary.
-        if webrtc_deps_entry.revision != new_rev:
-            logging.debug('Roll dependency %s to %s', path, new_rev)
-            result.append(
-                ChangedDep(path, webrtc_deps_entry.url,
-                           webrtc_deps_entry.revision, new_rev))
+            result.extend(
+                _FindChangedDep(webrtc_deps_entry, cr_deps_entry.revision))
+        elif isinstance(webrtc_deps_entry, DepsEntry):
+            # Use the HEAD of the deps repo, resolved below.
+            pending_head_entries.append(webrtc_deps_entry)
+        # Otherwise the dependency has been removed from chromium.
+        # This is handled by FindRemovedDeps.
+
+    # The `git ls-remote` calls are independent network round trips, so
+    # issue them concurrently.
+    if pending_head_entries:
+        max_workers = min(len(pending_head_entries), LS_REMOTE_MAX_WORKERS)
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            head_revs = executor.map(lambda e: _GetRemoteHeadRevision(e.url),
+                                     pending_head_entries)
+            for webrtc_deps_entry, new_rev in zip(pending_head_entries,
+                                                  head_revs):
+                result.extend(_FindChangedDep(webrtc_deps_entry, new_rev))
     return sorted(result)
 
 
-def CalculateChangedClang(new_cr_rev):
+def CalculateChangedClang(new_clang_update_content):
+    """Compares the local Clang revision with the one in the given content.
+
+    Args:
+      new_clang_update_content: Content of Chromium's clang update script at
+          the new revision.
+    Returns:
+      A ChangedDep describing the Clang revision change.
+    """
 
     def GetClangRev(lines):
         for line in lines:
@@ -485,9 +591,7 @@ def CalculateChangedClang(new_cr_rev):
         current_lines = f.readlines()
     current_rev = GetClangRev(current_lines)
 
-    new_clang_update_py = ReadRemoteCrFile(CLANG_UPDATE_SCRIPT_URL_PATH,
-                                           new_cr_rev).splitlines()
-    new_rev = GetClangRev(new_clang_update_py)
+    new_rev = GetClangRev(new_clang_update_content.splitlines())
     return ChangedDep(CLANG_UPDATE_SCRIPT_LOCAL_PATH, None, current_rev,
                       new_rev)
 
@@ -560,38 +664,54 @@ def GenerateCommitMessage(
 
 
 def UpdateDepsFile(deps_filename, rev_update, changed_deps, new_cr_content):
-    """Update the DEPS file with the new revision."""
-
-    with open(deps_filename, 'rb') as deps_file:
-        deps_content = deps_file.read().decode('utf-8')
-
-    # Update the chromium_revision variable.
-    deps_content = deps_content.replace(rev_update.current_chromium_rev,
-                                        rev_update.new_chromium_rev)
-
-    # Add and remove dependencies. For now: only generated android deps.
-    # Since gclient cannot add or remove deps, we on the fact that
-    # these android deps are located in one place we can copy/paste.
-    deps_re = re.compile(ANDROID_DEPS_START + '.*' + ANDROID_DEPS_END,
-                         re.DOTALL)
-    new_deps = deps_re.search(new_cr_content)
-    old_deps = deps_re.search(deps_content)
-    if not new_deps or not old_deps:
-        faulty = 'Chromium' if not new_deps else 'WebRTC'
-        raise RollError('Was expecting to find "%s" and "%s"\n'
-                        'in %s DEPS' %
-                        (ANDROID_DEPS_START, ANDROID_DEPS_END, faulty))
-    deps_content = deps_re.sub(new_deps.group(0), deps_content)
+    """Update the DEPS file with the new revision.
 
-    for dep in changed_deps:
-        if isinstance(dep, ChangedVersionEntry):
-            deps_content = deps_content.replace(dep.current_version,
-                                                dep.new_version)
-
-    with open(deps_filename, 'wb') as deps_file:
-        deps_file.write(deps_content.encode('utf-8'))
+    Returns:
+      True if the DEPS file was modified, False otherwise.
+    """
 
-    # Update each individual DEPS entry.
+    with open(deps_filename, 'r+b') as deps_file:
+        old_deps_bytes = deps_file.read()
+        deps_content = old_deps_bytes.decode('utf-8')
+
+        # Add and remove dependencies. For now: only generated android deps.
+        # Since gclient cannot add or remove deps, we on the fact that
+        # these android deps are located in one place we can copy/paste.
+        deps_re = re.compile(ANDROID_DEPS_START + '.*' + ANDROID_DEPS_END,
+                             re.DOTALL)
+        new_deps = deps_re.search(new_cr_content)
+        old_deps = deps_re.search(deps_content)
+        if not new_deps or not old_deps:
+            faulty = 'Chromium' if not new_deps else 'WebRTC'
+            raise RollError('Was expecting to find "%s" and "%s"\n'
+                            'in %s DEPS' %
+                            (ANDROID_DEPS_START, ANDROID_DEPS_END, faulty))
+        deps_content = deps_re.sub(new_deps.group(0), deps_content)
+
+        # Update the chromium_revision variable and the version variables in
+        # a single pass over the content.
+        replacements = {
+            rev_update.current_chromium_rev: rev_update.new_chromium_rev
+        }
+        for dep in changed_deps:
+            if isinstance(dep, ChangedVersionEntry):
+                replacements[dep.current_version] = dep.new_version
+        # Prefer the longest match when one old value is a prefix of another.
+        replacements_re = re.compile('|'.join(
+            re.escape(old)
+            for old in sorted(replacements, key=len, reverse=True)))
+        deps_content = replacements_re.sub(lambda m: replacements[m.group(0)],
+                                           deps_content)
+
+        new_deps_bytes = deps_content.encode('utf-8')
+        deps_changed = new_deps_bytes != old_deps_bytes
+        if deps_changed:
+            deps_file.seek(0)
+            deps_file.truncate()
+            deps_file.write(new_deps_bytes)
+
+    # Update all the individual DEPS entries with a single gclient call.
+    setdep_args = []
     for dep in changed_deps:
         # ChangedVersionEntry types are already been processed.
         if isinstance(dep, ChangedVersionEntry):
@@ -610,16 +730,22 @@ def UpdateDepsFile(deps_filename, rev_update, changed_deps, new_cr_content):
             update = '%s:%s@%s' % (dep.path, package, dep.new_version)
         else:
             update = '%s@%s' % (dep.path, dep.new_rev)
-        _RunCommand(['gclient', 'setdep', '--revision', update],
+        setdep_args.extend(['--revision', update])
+    if setdep_args:
+        _RunCommand(['gclient', 'setdep'] + setdep_args,
                     working_dir=CHECKOUT_SRC_DIR)
+        deps_changed = True
+    return deps_changed
 
 
 def _IsTreeClean():
-    stdout, _ = _RunCommand(['git', 'status', '--porcelain'])
+    # Untracked files don't affect the roll, so don't make git look for them.
+    stdout, _ = _RunCommand(
+        ['git', 'status', '--porcelain', '--untracked-files=no'])
     if len(stdout) == 0:
         return True
 
-    logging.error('Dirty/unversioned files:\n%s', stdout)
+    logging.error('Dirty files:\n%s', stdout)
     return False
 
 
@@ -633,31 +759,30 @@ def _EnsureUpdatedMainBranch(dry_run):
             sys.exit(-1)
 
     logging.info('Updating main branch...')
-    _RunCommand(['git', 'pull'])
+    _RunCommandNoCapture(['git', 'pull'])
 
 
 def _CreateRollBranch(dry_run):
     logging.info('Creating roll branch: %s', ROLL_BRANCH_NAME)
     if not dry_run:
-        _RunCommand(['git', 'checkout', '-b', ROLL_BRANCH_NAME])
+        _RunCommandNoCapture(['git', 'checkout', '-b', ROLL_BRANCH_NAME])
 
 
 def _RemovePreviousRollBranch(dry_run):
-    active_branch, branches = _GetBranches()
-    if active_branch == ROLL_BRANCH_NAME:
-        active_branch = 'main'
-    if ROLL_BRANCH_NAME in branches:
+    if _BranchExists(ROLL_BRANCH_NAME):
         logging.info('Removing previous roll branch (%s)', ROLL_BRANCH_NAME)
         if not dry_run:
-            _RunCommand(['git', 'checkout', active_branch])
-            _RunCommand(['git', 'branch', '-D', ROLL_BRANCH_NAME])
+            # A branch can only be deleted when it isn't checked out.
+            if _GetActiveBranch() == ROLL_BRANCH_NAME:
+                _RunCommandNoCapture(['git', 'checkout', 'main'])
+            _RunCommandNoCapture(['git', 'branch', '-D', ROLL_BRANCH_NAME])
 
 
 def _LocalCommit(commit_msg, dry_run):
     logging.info('Committing changes locally.')
     if not dry_run:
-        _RunCommand(['git', 'add', '--update', '.'])
-        _RunCommand(['git', 'commit', '-m', commit_msg])
+        _RunCommandNoCapture(['git', 'add', '--update', '.'])
+        _RunCommandNoCapture(['git', 'commit', '-m', commit_msg])
 
 
 def ChooseCQMode(skip_cq, cq_over, current_commit_pos, new_commit_pos):
@@ -710,15 +835,17 @@ def _UploadCL(commit_queue_mode, add_cc=None):
                   stdout, stderr)
 
 
-def GetRollRevisionRanges(opts, webrtc_deps):
-    current_cr_rev = webrtc_deps['vars']['chromium_revision']
+def GetNewChromiumRevision(opts):
     new_cr_rev = opts.revision
     if not new_cr_rev:
-        stdout, _ = _RunCommand(['git', 'ls-remote', CHROMIUM_SRC_URL, 'HEAD'])
-        head_rev = stdout.strip().split('\t')[0]
+        head_rev = _GetRemoteHeadRevision(CHROMIUM_SRC_URL)
         logging.info('No revision specified. Using HEAD: %s', head_rev)
         new_cr_rev = head_rev
+    return new_cr_rev
+
 
+def GetRollRevisionRanges(webrtc_deps, new_cr_rev):
+    current_cr_rev = webrtc_deps['vars']['chromium_revision']
     return ChromiumRevisionUpdate(current_cr_rev, new_cr_rev)
 
 
@@ -776,20 +903,33 @@ def main():
     if opts.clean:
         _RemovePreviousRollBranch(opts.dry_run)
 
-    if not opts.ignore_unclean_workdir:
-        _EnsureUpdatedMainBranch(opts.dry_run)
+    new_cr_rev = GetNewChromiumRevision(opts)
+
+    # The remote reads are independent of each other and of the local
+    # checkout, so let them share the connection pool concurrently. Reads of
+    # the new revision also overlap with updating the main branch. Local files
+    # are only read once that update is done.
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        new_commit_future = executor.submit(ReadRemoteCrCommit, new_cr_rev)
+        new_cr_content_future = executor.submit(ReadRemoteCrFile, 'DEPS',
+                                                new_cr_rev)
+        new_clang_update_future = executor.submit(
+            ReadRemoteCrFile, CLANG_UPDATE_SCRIPT_URL_PATH, new_cr_rev)
+
+        if not opts.ignore_unclean_workdir:
+            _EnsureUpdatedMainBranch(opts.dry_run)
 
-    deps_filename = os.path.join(CHECKOUT_SRC_DIR, 'DEPS')
-    webrtc_deps = ParseLocalDepsFile(deps_filename)
+        deps_filename = os.path.join(CHECKOUT_SRC_DIR, 'DEPS')
+        webrtc_deps = ParseLocalDepsFile(deps_filename)
 
-    rev_update = GetRollRevisionRanges(opts, webrtc_deps)
+        rev_update = GetRollRevisionRanges(webrtc_deps, new_cr_rev)
+        current_commit_future = executor.submit(
+            ReadRemoteCrCommit, rev_update.current_chromium_rev)
 
-    current_commit_pos = ParseCommitPosition(
-        ReadRemoteCrCommit(rev_update.current_chromium_rev))
-    new_commit_pos = ParseCommitPosition(
-        ReadRemoteCrCommit(rev_update.new_chromium_rev))
+    current_commit_pos = ParseCommitPosition(current_commit_future.result())
+    new_commit_pos = ParseCommitPosition(new_commit_future.result())
 
-    new_cr_content = ReadRemoteCrFile('DEPS', rev_update.new_chromium_rev)
+    new_cr_content = new_cr_content_future.result()
     new_cr_deps = ParseDepsDict(new_cr_content)
     changed_deps = CalculateChangedDeps(webrtc_deps, new_cr_deps)
     # Discard other deps, assumed to be chromium-only dependencies.
@@ -801,7 +941,7 @@ def main():
                         'Remove them or add them to either '
                         'WEBRTC_ONLY_DEPS or DONT_AUTOROLL_THESE.' %
                         other_deps)
-    clang_change = CalculateChangedClang(rev_update.new_chromium_rev)
+    clang_change = CalculateChangedClang(new_clang_update_future.result())
     commit_msg = GenerateCommitMessage(
         rev_update,
         current_commit_pos,
@@ -813,9 +953,17 @@ def main():
     logging.debug('Commit message:\n%s', commit_msg)
 
     _CreateRollBranch(opts.dry_run)
+    deps_changed = False
     if not opts.dry_run:
-        UpdateDepsFile(deps_filename, rev_update, changed_deps, new_cr_content)
-    if _IsTreeClean():
+        deps_changed = UpdateDepsFile(deps_filename, rev_update, changed_deps,
+                                      new_cr_content)
+    if opts.ignore_unclean_workdir:
+        # The tree may have been dirty before the roll and local changes are
+        # committed along with it, so ask git as before.
+        deps_changed = not _IsTreeClean()
+    # Otherwise the tree was verified clean above, so only UpdateDepsFile can
+    # have changed it and there is no need to make git rescan it.
+    if not deps_changed:
         logging.info("No DEPS changes detected, skipping CL creation.")
     else:
         _LocalCommit(commit_msg, opts.dry_run)
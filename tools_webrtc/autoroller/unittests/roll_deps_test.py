@@ -14,6 +14,7 @@ import os
 import shutil
 import sys
 import tempfile
+import time
 import unittest
 import mock
 
@@ -74,6 +75,25 @@ class FakeCmd:
     return exp_returns
 
 
+class FakeLsRemote:
+  """Answers `git ls-remote <url> HEAD` calls in any order, matched by URL.
+
+  The replies to earlier URLs are delayed the most, so concurrent lookups
+  finish in the reverse order of the calls.
+  """
+
+  def __init__(self, head_revisions):
+    self.head_revisions = head_revisions
+    self.urls = list(head_revisions)
+
+  def __call__(self, command, text=True):
+    if command[:2] != ['git', 'ls-remote'] or command[3:] != ['HEAD'] or text:
+      raise TestError('Got unexpected\n%s' % command)
+    url = command[2]
+    time.sleep(0.01 * (len(self.urls) - self.urls.index(url)))
+    return ('%s\tHEAD\n' % self.head_revisions[url]).encode('utf-8'), None
+
+
 class NullCmd:
   """No-op mock when calls mustn't be checked. """
 
@@ -111,14 +131,55 @@ class TestRollChromiumRevision(unittest.TestCase):
     with open(self._new_cr_depsfile_android, 'rb') as deps_file:
       new_cr_contents = deps_file.read().decode('utf-8')
 
-    UpdateDepsFile(self._webrtc_depsfile,
-                   ChromiumRevisionUpdate(current_rev, new_rev), [],
-                   new_cr_contents)
+    deps_changed = UpdateDepsFile(self._webrtc_depsfile,
+                                  ChromiumRevisionUpdate(current_rev, new_rev),
+                                  [], new_cr_contents)
+    self.assertTrue(deps_changed)
     with open(self._webrtc_depsfile, 'rb') as deps_file:
       deps_contents = deps_file.read().decode('utf-8')
       self.assertTrue(new_rev in deps_contents,
                       'Failed to find %s in\n%s' % (new_rev, deps_contents))
 
+  def testUpdateDepsFileReportsUnchangedFile(self):
+    with open(self._webrtc_depsfile_android, 'rb') as deps_file:
+      webrtc_contents = deps_file.read()
+
+    deps_changed = UpdateDepsFile(self._webrtc_depsfile_android,
+                                  NO_CHROMIUM_REVISION_UPDATE, [],
+                                  webrtc_contents.decode('utf-8'))
+    self.assertFalse(deps_changed)
+    with open(self._webrtc_depsfile_android, 'rb') as deps_file:
+      self.assertEqual(deps_file.read(), webrtc_contents)
+
+  def testUpdateDepsFileReplacesRevisionAndVersionsInOnePass(self):
+    deps_template = ('vars = {\n'
+                     '  "chromium_revision": "%s",\n'
+                     '  "fuchsia_version": "%s",\n'
+                     '  "other_version": "%s",\n'
+                     '}\n'
+                     '# === ANDROID_DEPS Generated Code Start ===\n'
+                     '# === ANDROID_DEPS Generated Code End ===\n')
+    deps_filename = os.path.join(self._output_dir, 'DEPS.versions')
+    with open(deps_filename, 'w') as deps_file:
+      deps_file.write(deps_template % ('cafe', 'version:1.2', 'version:1.2.3'))
+    # 'version:1.2' is a prefix of 'version:1.2.3', so the longer value must
+    # win where both match.
+    changed_deps = [
+        roll_deps.ChangedVersionEntry('fuchsia', 'version:1.2', 'version:2.0'),
+        roll_deps.ChangedVersionEntry('other', 'version:1.2.3',
+                                      'version:1.2.4'),
+    ]
+
+    with mock.patch('roll_deps._RunCommand', self.fake):
+      deps_changed = UpdateDepsFile(deps_filename,
+                                    ChromiumRevisionUpdate('cafe', 'beef'),
+                                    changed_deps, deps_template % ('', '', ''))
+
+    self.assertTrue(deps_changed)
+    with open(deps_filename) as deps_file:
+      self.assertEqual(deps_file.read(),
+                       deps_template % ('beef', 'version:2.0', 'version:1.2.4'))
+
   def _UpdateDepsSetup(self):
     with open(self._webrtc_depsfile_android, 'rb') as deps_file:
       webrtc_contents = deps_file.read().decode('utf-8')
@@ -159,6 +220,28 @@ class TestRollChromiumRevision(unittest.TestCase):
     self.assertTrue(removed in webrtc_contents)
     self.assertFalse(removed in updated_contents)
 
+  def testUpdateDepsFileBatchesSetdepCalls(self):
+    with open(self._new_cr_depsfile_android, 'rb') as deps_file:
+      new_cr_contents = deps_file.read().decode('utf-8')
+    changed_deps = [
+        roll_deps.ChangedDep('src/build', 'https://build.com', BUILD_OLD_REV,
+                             BUILD_NEW_REV),
+        roll_deps.ChangedCipdPackage('src/buildtools/linux64', 'gn/gn', 'old',
+                                     'new'),
+    ]
+    setdep_cmd = [
+        'gclient', 'setdep',
+        '--revision', 'src/build@%s' % BUILD_NEW_REV,
+        '--revision', 'src/buildtools/linux64:gn/gn@new'
+    ]
+    self.fake.AddExpectation(setdep_cmd,
+                             working_dir=roll_deps.CHECKOUT_SRC_DIR)
+    # The dependency directories only exist in a fully synced checkout.
+    with mock.patch('roll_deps._RunCommand', self.fake), \
+        mock.patch('os.path.isdir', return_value=True):
+      UpdateDepsFile(self._webrtc_depsfile_android, NO_CHROMIUM_REVISION_UPDATE,
+                     changed_deps, new_cr_contents)
+
   def testParseDepsDict(self):
     with open(self._webrtc_depsfile, 'rb') as deps_file:
       deps_contents = deps_file.read().decode('utf-8')
@@ -173,6 +256,18 @@ class TestRollChromiumRevision(unittest.TestCase):
     self.assertEqual(len(local_scope['deps']), 3)
     self.assertEqual(len(local_scope['deps_os']), 1)
 
+  def testParseCommitPosition(self):
+    commit_message = ('Some change\n\n'
+                      'Mentions Cr-Commit-Position: refs/heads/main@{#1}\n'
+                      'Cr-Commit-Position: refs/heads/main@{#1000}\n'
+                      '  Cr-Commit-Position: refs/heads/main@{#1234}  \n')
+    self.assertEqual(roll_deps.ParseCommitPosition(commit_message), 1234)
+
+  def testParseCommitPositionSkipsFootersNotAtLineStart(self):
+    commit_message = ('Cr-Commit-Position: refs/heads/main@{#1000}\n'
+                      'Reverts Cr-Commit-Position: refs/heads/main@{#1}\n')
+    self.assertEqual(roll_deps.ParseCommitPosition(commit_message), 1000)
+
   def testGetMatchingDepsEntriesReturnsPathInSimpleCase(self):
     entries = GetMatchingDepsEntries(DEPS_ENTRIES, 'src/testing/gtest')
     self.assertEqual(len(entries), 1)
@@ -214,6 +309,42 @@ class TestRollChromiumRevision(unittest.TestCase):
     self.assertEqual(changed_deps[3].current_rev, DEPOTTOOLS_OLD_REV)
     self.assertEqual(changed_deps[3].new_rev, DEPOTTOOLS_NEW_REV)
 
+  def testCalculateChangedDepsKeepsConcurrentHeadRevisionsPaired(self):
+    webrtc_deps = {
+        'deps': {
+            'src/a': 'https://a.com@a-old',
+            'src/b': 'https://b.com@b-old',
+            'src/c': 'https://c.com@c-current',
+            'src/d': 'https://d.com@d-old',
+        }
+    }
+    fake = FakeLsRemote({
+        'https://a.com': 'a-new',
+        'https://b.com': 'b-new',
+        'https://c.com': 'c-current',
+        'https://d.com': 'd-new',
+    })
+    with mock.patch('roll_deps._RunCommand', fake):
+      changed_deps = CalculateChangedDeps(webrtc_deps, {'deps': {}})
+
+    self.assertEqual(
+        sorted((d.path, d.url, d.current_rev, d.new_rev) for d in changed_deps),
+        [
+            ('src/a', 'https://a.com', 'a-old', 'a-new'),
+            ('src/b', 'https://b.com', 'b-old', 'b-new'),
+            ('src/d', 'https://d.com', 'd-old', 'd-new'),
+        ])
+
+  def testCalculateChangedClang(self):
+    local_path = os.path.join(self._output_dir, 'update.py')
+    with open(local_path, 'w') as f:
+      f.write("CLANG_REVISION = 'llvmorg-1-init-1-abc'\n")
+    new_content = "import os\nCLANG_REVISION = 'llvmorg-2-init-2-def'\n"
+    with mock.patch('roll_deps.CLANG_UPDATE_SCRIPT_LOCAL_PATH', local_path):
+      clang_change = roll_deps.CalculateChangedClang(new_content)
+    self.assertEqual(clang_change.current_rev, 'llvmorg-1-init-1-abc')
+    self.assertEqual(clang_change.new_rev, 'llvmorg-2-init-2-def')
+
   def testWithDistinctDeps(self):
     """Check CalculateChangedDeps works when deps are added/removed."""
     webrtc_deps = ParseLocalDepsFile(self._webrtc_depsfile_android)
@@ -333,38 +464,65 @@ class TestReadUrlContent(unittest.TestCase):
     self.url = 'http://localhost+?format=TEXT'
 
   def testReadUrlContent(self):
-    url_mock = mock.Mock()
-    roll_deps.urllib.request.urlopen = url_mock
+    response_mock = mock.Mock(content=b'line 1\nline 2\n')
+    get_mock = mock.Mock(return_value=response_mock)
 
-    roll_deps.ReadUrlContent(self.url)
+    with mock.patch('roll_deps._SESSION.get', get_mock):
+      lines = roll_deps.ReadUrlContent(self.url)
 
-    calls = [
-        mock.call('http://localhost+?format=TEXT'),
-        mock.call().readlines(),
-        mock.call().close()
-    ]
-    self.assertEqual(url_mock.mock_calls, calls)
+    get_mock.assert_called_once_with('http://localhost+?format=TEXT')
+    response_mock.raise_for_status.assert_called_once_with()
+    self.assertEqual(lines, [b'line 1\n', b'line 2\n'])
 
   def testReadUrlContentError(self):
-    roll_deps.logging = mock.Mock()
-
-    readlines_mock = mock.Mock()
-    readlines_mock.readlines = mock.Mock(
-        side_effect=IOError('Connection error'))
-    readlines_mock.close = mock.Mock()
-
-    url_mock = mock.Mock(return_value=readlines_mock)
-    roll_deps.urllib.request.urlopen = url_mock
-
-    try:
-      roll_deps.ReadUrlContent(self.url)
-    except OSError:
-      self.assertTrue(roll_deps.logging.exception.called)
+    get_mock = mock.Mock(
+        side_effect=roll_deps.requests.ConnectionError('Connection error'))
+
+    with mock.patch('roll_deps._SESSION.get', get_mock), \
+        mock.patch('roll_deps.logging') as logging_mock:
+      with self.assertRaises(roll_deps.requests.ConnectionError):
+        roll_deps.ReadUrlContent(self.url)
+      self.assertTrue(logging_mock.exception.called)
+
+  def testReadGitilesContentDecodesWholeBody(self):
+    # pylint: disable=protected-access
+    response_mock = mock.Mock(content=b'bGluZSAxCmxpbmUgMgo=')
+    get_mock = mock.Mock(return_value=response_mock)
+
+    with mock.patch('roll_deps._SESSION.get', get_mock), \
+        mock.patch.object(roll_deps, '_GITILES_CACHE',
+                          roll_deps._SizeBoundedLruCache(1024)):
+      content = roll_deps._ReadGitilesContent('http://localhost')
+      cached_content = roll_deps._ReadGitilesContent('http://localhost')
+
+    get_mock.assert_called_once_with('http://localhost?format=TEXT')
+    self.assertEqual(content, 'line 1\nline 2\n')
+    self.assertEqual(cached_content, content)
+
+
+class TestSizeBoundedLruCache(unittest.TestCase):
+  def testEvictsLeastRecentlyUsed(self):
+    # pylint: disable=protected-access
+    cache = roll_deps._SizeBoundedLruCache(6)
+    cache.Put('a', 'aa')
+    cache.Put('b', 'bb')
+    self.assertEqual(cache.Get('a'), 'aa')
+    cache.Put('c', 'cccc')
+    self.assertEqual(cache.Get('a'), 'aa')
+    self.assertIsNone(cache.Get('b'))
+    self.assertEqual(cache.Get('c'), 'cccc')
+
+  def testSkipsValuesLargerThanTheCache(self):
+    # pylint: disable=protected-access
+    cache = roll_deps._SizeBoundedLruCache(2)
+    cache.Put('a', 'aaa')
+    self.assertIsNone(cache.Get('a'))
 
 
 def _SetupGitLsRemoteCall(cmd_fake, url, revision):
   cmd = ['git', 'ls-remote', url, revision]
-  cmd_fake.AddExpectation(cmd, _returns=(revision, None))
+  stdout = ('%s\t%s\n' % (revision, revision)).encode('utf-8')
+  cmd_fake.AddExpectation(cmd, text=False, _returns=(stdout, None))
 
 
 if __name__ == '__main__':
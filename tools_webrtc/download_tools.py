@@ -54,7 +54,7 @@ def main(directories):
     except (gclient_utils.Error, subprocess2.CalledProcessError) as e:
       print('Error: %s' % str(e))
       return 2
-    return 0
+  return 0
 
 
 if __name__ == '__main__':